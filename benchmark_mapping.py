@@ -0,0 +1,256 @@
+import os
+import sys
+import json
+import time
+import shutil
+import asyncio
+import argparse
+import tempfile
+import threading
+import subprocess
+import urllib.parse
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+GOLDEN_DIR = os.path.join(REPO_DIR, 'golden')
+CORPUS_FILE = os.path.join(GOLDEN_DIR, 'corpus.txt')
+RESPONSES_FILE = os.path.join(GOLDEN_DIR, 'responses.json')
+EXPECTED_FILE = os.path.join(GOLDEN_DIR, 'expected.json')
+organisemedia = None
+
+
+class StandInServer(ThreadingHTTPServer):
+    # socketserver's default backlog of 5 is smaller than the number of
+    # concurrent movie lookups; dropped connections are retried by TCP a
+    # second later, which made timings jump between runs.
+    request_queue_size = 128
+    daemon_threads = True
+
+
+class StandIn:
+    """Local Cinemeta stand-in serving recorded responses.
+
+    With `upstream` set, requests that haven't been recorded yet are
+    fetched from it and recorded; otherwise they get a 404 and are listed
+    in `misses`.
+    """
+
+    def __init__(self, responses, upstream=None, latency=0.0):
+        self.responses = responses
+        self.upstream = upstream
+        self.latency = latency
+        self.misses = []
+        self.requests = 0
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                status, body = stand_in.respond(urllib.parse.unquote(self.path))
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        self.server = StandInServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def respond(self, path):
+        self.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if path not in self.responses and self.upstream:
+            url = self.upstream + urllib.parse.quote(path, safe='/=')
+            try:
+                with urllib.request.urlopen(url, timeout=30) as response:
+                    self.responses[path] = [response.status, json.load(response)]
+            except urllib.error.HTTPError as e:
+                self.responses[path] = [e.code, {}]
+        if path not in self.responses:
+            self.misses.append(path)
+            return 404, {}
+        return self.responses[path]
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def load_corpus(corpus_file=CORPUS_FILE):
+    with open(corpus_file, 'r', encoding='utf-8') as f:
+        return [line.rstrip('\n') for line in f if line.strip() and not line.startswith('#')]
+
+def load_responses():
+    try:
+        with open(RESPONSES_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def load_organiser(code_dir=REPO_DIR):
+    """Import organisemedia (and the modules next to it) from code_dir, silenced."""
+    global organisemedia
+    sys.path.insert(0, code_dir)
+    import organisemedia
+    organisemedia.log_message = lambda *args: None
+
+def reset_caches():
+    for cache in ('_api_cache', '_meta_cache', '_warm_cache', 'season_cache'):
+        getattr(organisemedia, cache, {}).clear()
+
+def run_mapping(corpus):
+    """Link the corpus in a scratch directory; returns ({source: destination}, seconds)."""
+    work_dir = tempfile.mkdtemp(prefix='golden-')
+    cwd = os.getcwd()
+    try:
+        os.chdir(work_dir)
+        for path in corpus:
+            os.makedirs(os.path.dirname(os.path.join('src', path)), exist_ok=True)
+            open(os.path.join('src', path), 'w').close()
+        reset_caches()
+        start = time.perf_counter()
+        if hasattr(organisemedia, 'Config'):
+            config = organisemedia.Config(src_dir='src', dest_dir='dest')
+            asyncio.run(organisemedia.create_symlinks(config, force=True))
+            links_file = config.links_pkl
+        else:
+            asyncio.run(organisemedia.create_symlinks('src', 'dest', force=True))
+            links_file = organisemedia.links_pkl
+        elapsed = time.perf_counter() - start
+        links = organisemedia.load_links(links_file)
+        mapping = {os.path.relpath(src, 'src'): os.path.relpath(dest, 'dest') for src, dest in links}
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(work_dir)
+    return mapping, elapsed
+
+def measure(code_dir, runs, latency):
+    """Time `runs` passes over the corpus with the organiser in code_dir, in a fresh interpreter."""
+    command = [sys.executable, os.path.abspath(__file__), '--measure', code_dir,
+               '--runs', str(runs), '--latency', str(latency)]
+    result = subprocess.run(command, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else f"exit status {result.returncode}")
+    return json.loads(result.stdout)
+
+def export_revision(revision):
+    """Check out `revision` of this repository into a temporary directory."""
+    archive = subprocess.run(['git', '-C', REPO_DIR, 'archive', revision], capture_output=True, check=True)
+    target = tempfile.mkdtemp(prefix='golden-ref-')
+    subprocess.run(['tar', '-x', '-C', target], input=archive.stdout, check=True)
+    return target
+
+def compare_speed(revision, rounds, runs, latency):
+    """Return (files/sec now, files/sec at `revision`), fastest run of each.
+
+    Both sides run in the same invocation and take turns, so machine load
+    and disk speed affect them alike and no machine-specific number has to
+    be stored.
+    """
+    ref_dir = export_revision(revision)
+    try:
+        timings = {REPO_DIR: [], ref_dir: []}
+        for i in range(rounds):
+            order = [REPO_DIR, ref_dir] if i % 2 == 0 else [ref_dir, REPO_DIR]
+            for code_dir in order:
+                timings[code_dir] += measure(code_dir, runs, latency)
+    finally:
+        shutil.rmtree(ref_dir)
+    files = len(load_corpus())
+    return files / min(timings[REPO_DIR]), files / min(timings[ref_dir])
+
+def compare(expected, actual):
+    problems = []
+    for src in sorted(set(expected) | set(actual)):
+        if src not in actual:
+            problems.append(f"missing: {src}\n    expected {expected[src]}")
+        elif src not in expected:
+            problems.append(f"unexpected: {src}\n    now -> {actual[src]}")
+        elif expected[src] != actual[src]:
+            problems.append(f"changed: {src}\n    expected {expected[src]}\n    now      {actual[src]}")
+    return problems
+
+def main():
+    parser = argparse.ArgumentParser(description='Check that every release name in the golden corpus still maps to the same destination, and that files/sec has not regressed compared with another revision.')
+    parser.add_argument('--against', default='HEAD~1', metavar='REVISION', help='Git revision to compare files/sec with, timed in the same invocation (default: HEAD~1)')
+    parser.add_argument('--rounds', type=int, default=5, help='Times each side is run, alternating between them (default: 5)')
+    parser.add_argument('--runs', type=int, default=2, help='Timed passes per round; the fastest pass of each side is compared (default: 2)')
+    parser.add_argument('--threshold', type=float, default=0.2, help='Allowed files/sec drop relative to the other revision (default: 0.2 = 20%%)')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds of artificial latency per metadata request (default: 0)')
+    parser.add_argument('--no-speed', action='store_true', help='Only check the mapping')
+    parser.add_argument('--update', action='store_true', help='Accept the current mapping as the new golden file')
+    parser.add_argument('--record', nargs='?', const='', metavar='UPSTREAM', help="Fetch and record responses missing from responses.json (default upstream: organisemedia's CINEMETA_URL)")
+    parser.add_argument('--measure', metavar='CODE_DIR', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        load_organiser(args.measure)
+        corpus = load_corpus()
+        with StandIn(load_responses(), latency=args.latency) as stand_in:
+            organisemedia.CINEMETA_URL = stand_in.url
+            run_mapping(corpus)
+            print(json.dumps([run_mapping(corpus)[1] for _ in range(args.runs)]))
+        return
+
+    load_organiser()
+    corpus = load_corpus()
+    responses = load_responses()
+    upstream = None if args.record is None else args.record or organisemedia.CINEMETA_URL
+    with StandIn(responses, upstream, args.latency) as stand_in:
+        organisemedia.CINEMETA_URL = stand_in.url
+        mapping, _ = run_mapping(corpus)
+
+    if upstream:
+        with open(RESPONSES_FILE, 'w', encoding='utf-8') as f:
+            json.dump(responses, f, indent=1, sort_keys=True)
+        print(f"Recorded {len(responses)} responses")
+    if stand_in.misses:
+        print(f"{len(set(stand_in.misses))} requests have no recorded response, run with --record:")
+        for path in sorted(set(stand_in.misses)):
+            print(f"  {path}")
+        sys.exit(1)
+    print(f"{len(corpus)} files, {len(mapping)} links, {stand_in.requests} metadata requests per run")
+
+    if args.update:
+        with open(EXPECTED_FILE, 'w', encoding='utf-8') as f:
+            json.dump(mapping, f, indent=1, sort_keys=True)
+        print(f"Updated {os.path.relpath(EXPECTED_FILE)}")
+        return
+
+    with open(EXPECTED_FILE, 'r', encoding='utf-8') as f:
+        expected = json.load(f)
+    failed = False
+    problems = compare(expected, mapping)
+    if problems:
+        failed = True
+        print(f"FAIL: {len(problems)} destination(s) differ from {os.path.relpath(EXPECTED_FILE)}")
+        for problem in problems:
+            print(f"  {problem}")
+    else:
+        print(f"OK: all {len(expected)} destinations match")
+
+    if not args.no_speed:
+        try:
+            now, before = compare_speed(args.against, args.rounds, args.runs, args.latency)
+        except (subprocess.CalledProcessError, RuntimeError) as e:
+            print(f"Could not time {args.against}, skipping the speed check: {e}")
+        else:
+            print(f"{now:.0f} files/sec, {before:.0f} files/sec at {args.against} (fastest of {args.rounds * args.runs} passes each)")
+            if now < before * (1 - args.threshold):
+                failed = True
+                print(f"FAIL: more than {args.threshold:.0%} slower than {args.against}")
+            else:
+                print(f"OK: within {args.threshold:.0%} of {args.against}")
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+import os
+import json
+import time
+import asyncio
+
+DEFAULT_SOCKET = 'organiser.sock'
+DEFAULT_INTERVAL = 120
+MIN_INTERVAL = 30
+MAX_INTERVAL = 900
+
+
+def next_interval(interval, created, min_interval=MIN_INTERVAL, max_interval=MAX_INTERVAL):
+    """Halve the poll interval after a pass that linked something, back off by half again when idle."""
+    if created:
+        return max(min_interval, interval / 2)
+    return min(max_interval, interval * 1.5)
+
+def _remove_stale_socket(socket_path):
+    if not os.path.exists(socket_path):
+        return
+    try:
+        import socket
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(socket_path)
+    except OSError:
+        os.unlink(socket_path)
+        return
+    raise RuntimeError(f"Another daemon is already listening on {socket_path}")
+
+async def run_daemon(run_pass, socket_path=DEFAULT_SOCKET, interval=DEFAULT_INTERVAL,
+                     min_interval=MIN_INTERVAL, max_interval=MAX_INTERVAL, log=print):
+    """Run passes on an adaptive timer and whenever a client asks for one over the UNIX socket.
+
+    `run_pass(folder)` is awaited with a torrent folder name, or None for a
+    full pass, and returns the list of links it created, or None if it had
+    to skip the pass (e.g. another instance is busy). Skipped folders are
+    queued again for the next wake, and the interval is left as it is.
+    """
+    state = {
+        'pid': os.getpid(),
+        'started': time.time(),
+        'running': None,
+        'passes': 0,
+        'last_pass': None,
+        'last_created': 0,
+        'total_created': 0,
+        'interval': interval,
+        'next_run': time.time() + interval,
+        'pending': [],
+    }
+    wake = asyncio.Event()
+
+    async def handle_client(reader, writer):
+        try:
+            line = await reader.readline()
+            try:
+                request = json.loads(line or b'{}')
+            except json.JSONDecodeError:
+                request = {}
+            cmd = request.get('cmd')
+            if cmd == 'scan':
+                folder = request.get('folder') or None
+                if folder not in state['pending']:
+                    state['pending'].append(folder)
+                wake.set()
+                response = {'ok': True, 'queued': folder or 'all', 'status': _status(state)}
+            elif cmd == 'status':
+                response = {'ok': True, 'status': _status(state)}
+            else:
+                response = {'ok': False, 'error': f"Unknown command: {cmd}"}
+            writer.write(json.dumps(response).encode() + b'\n')
+            await writer.drain()
+        finally:
+            writer.close()
+
+    _remove_stale_socket(socket_path)
+    server = await asyncio.start_unix_server(handle_client, path=socket_path)
+    os.chmod(socket_path, 0o600)
+    log('[INFO]', f"Daemon listening on {os.path.abspath(socket_path)}")
+
+    try:
+        while True:
+            try:
+                await asyncio.wait_for(wake.wait(), timeout=max(0, state['next_run'] - time.time()))
+            except asyncio.TimeoutError:
+                state['pending'].append(None)
+            wake.clear()
+
+            scopes = state['pending']
+            state['pending'] = []
+            if None in scopes:
+                scopes = [None]
+
+            created = 0
+            skipped = []
+            for folder in scopes:
+                state['running'] = folder or 'all'
+                try:
+                    result = await run_pass(folder)
+                    if result is None:
+                        skipped.append(folder)
+                    else:
+                        created += len(result)
+                except Exception as e:
+                    log('ERROR', f"Pass for {folder or 'all folders'} failed: {e}")
+                finally:
+                    state['running'] = None
+
+            for folder in skipped:
+                if folder not in state['pending']:
+                    state['pending'].append(folder)
+            if len(skipped) < len(scopes):
+                state['passes'] += 1
+                state['last_pass'] = time.time()
+                state['last_created'] = created
+                state['total_created'] += created
+                state['interval'] = next_interval(state['interval'], created, min_interval, max_interval)
+            state['next_run'] = time.time() + state['interval']
+            log('[INFO]', f"Next scan in {int(state['interval'])} seconds")
+    finally:
+        server.close()
+        await server.wait_closed()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+def _status(state):
+    status = dict(state)
+    status['pending'] = [folder or 'all' for folder in state['pending']]
+    status['next_run_in'] = max(0, int(state['next_run'] - time.time()))
+    return status
+
+async def send_command(cmd, socket_path=DEFAULT_SOCKET, **params):
+    """Send a single command to a running daemon and return its decoded reply."""
+    reader, writer = await asyncio.open_unix_connection(socket_path)
+    try:
+        writer.write(json.dumps({'cmd': cmd, **params}).encode() + b'\n')
+        await writer.drain()
+        return json.loads(await reader.readline())
+    finally:
+        writer.close()
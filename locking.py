@@ -0,0 +1,123 @@
+import os
+import glob
+import argparse
+import json
+import time
+import fcntl
+import socket
+import hashlib
+import threading
+from contextlib import contextmanager
+
+LEASE_TTL = 300
+
+
+class LeaseHeld(Exception):
+    pass
+
+
+@contextmanager
+def file_lock(path):
+    """Exclusive advisory lock on `<path>.lock`, shared by every instance that uses the same path."""
+    with open(f"{path}.lock", 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def atomic_dump(data, path, dump):
+    """Write via a temporary file and rename, so readers never see a half written file."""
+    tmp_path = f"{path}.{socket.gethostname()}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        dump(data, f)
+    os.replace(tmp_path, path)
+
+def lease_owner():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def _read_lease(path):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+def _write_lease(path, ttl):
+    lease = {'owner': lease_owner(), 'expires': time.time() + ttl}
+    atomic_dump(json.dumps(lease).encode(), path, lambda data, f: f.write(data))
+
+def _live_holder(path):
+    lease = _read_lease(path)
+    if lease and lease['owner'] != lease_owner() and lease['expires'] > time.time():
+        return lease['owner']
+    return None
+
+def acquire_lease(path, ttl=LEASE_TTL, excludes=(), lock=None):
+    """Take the lease at `path` unless another live instance holds it or a lease matching `excludes`.
+
+    `excludes` are glob patterns. Leases that exclude each other must be
+    taken under the same `lock` path. Returns a description of the
+    conflicting lease on failure.
+    """
+    with file_lock(lock or path):
+        others = [path] + [other for pattern in excludes for other in sorted(glob.glob(pattern))]
+        for other in others:
+            holder = _live_holder(other)
+            if holder:
+                return f"{os.path.basename(other)} is held by {holder}"
+        _write_lease(path, ttl)
+    return None
+
+def release_lease(path, lock=None):
+    with file_lock(lock or path):
+        lease = _read_lease(path)
+        if lease and lease['owner'] == lease_owner():
+            os.remove(path)
+
+@contextmanager
+def hold_lease(path, ttl=LEASE_TTL, excludes=(), lock=None, log=print):
+    """Hold the lease for the duration of the block, renewing it from a background thread.
+
+    The renewal runs on a thread rather than the event loop because lookups
+    made with requests block the loop for as long as they take. If another
+    instance has taken the lease over in the meantime, renewal stops and
+    the loss is logged.
+    """
+    conflict = acquire_lease(path, ttl, excludes, lock)
+    if conflict:
+        raise LeaseHeld(conflict)
+
+    stop = threading.Event()
+
+    def renew():
+        while not stop.wait(ttl / 3):
+            with file_lock(lock or path):
+                lease = _read_lease(path)
+                if lease and lease['owner'] != lease_owner():
+                    log('ERROR', f"Lost {os.path.basename(path)} to {lease['owner']}, another instance may now be writing at the same time")
+                    return
+                _write_lease(path, ttl)
+
+    renewer = threading.Thread(target=renew, daemon=True)
+    renewer.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        renewer.join()
+        release_lease(path, lock)
+
+def parse_shard(value):
+    """Parse `I/N` into (I, N) with 0 <= I < N."""
+    try:
+        index, count = (int(part) for part in value.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid shard '{value}', expected INDEX/COUNT such as 0/3")
+    if count < 1 or not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"Invalid shard '{value}', INDEX must be between 0 and COUNT - 1")
+    return index, count
+
+def shard_of(folder_name, count):
+    """Stable across hosts and Python runs, unlike hash()."""
+    return int(hashlib.md5(folder_name.encode('utf-8')).hexdigest(), 16) % count
@@ -1,23 +1,28 @@
 import os
+import glob
 import argparse
 import re, string
-import shutil
-import requests
 import json
 import time
-import difflib
-import pickle, subprocess
-from collections import defaultdict
-import asyncio, aioconsole, aiohttp
+import pickle
+import asyncio
+from dataclasses import dataclass, field
 from colorama import init, Fore, Style
-from scan_plex import ensure_plex_config, scan_plex_library_sections
+from daemon import DEFAULT_SOCKET, run_daemon, send_command
+from locking import LeaseHeld, atomic_dump, file_lock, hold_lease, parse_shard, shard_of
+# requests, aiohttp, aioconsole, difflib, shutil and scan_plex are imported
+# where they are needed so runs that link nothing new start quickly.
 init(autoreset=True)
 
 
 SETTINGS_FILE = 'settings.json'
-links_pkl = 'symlinks.pkl'
-ignored_file = 'ignored.pkl'
+CINEMETA_URL = 'https://v3-cinemeta.strem.io'
+MOVIE_CONCURRENCY = 10
+DEFAULT_QUALITY_PREFERENCE = ['2160p', '1080p', '720p', '576p', '480p']
+REBUILD_WORKERS = 16
 _api_cache = {}
+_meta_cache = {}
+_warm_cache = {}
 season_cache = {}
 
 LOG_LEVELS = {
@@ -44,6 +49,7 @@ def log_message(log_level, message):
 
 def are_similar(folder_name, show_name, threshold=0.8):
     """Check if the folder name is mostly the same as the show name"""
+    import difflib
     folder_name = re.sub(r'[^\w\s]', '', folder_name)
     show_name = re.sub(r'[^\w\s]', '', show_name)
     similarity = difflib.SequenceMatcher(None, folder_name, show_name).ratio()
@@ -51,9 +57,17 @@ def are_similar(folder_name, show_name, threshold=0.8):
     return similarity >= threshold
 
 
-def save_link(data, file_path):
-    with open(file_path, 'wb') as f:
-        pickle.dump(data, f)
+def save_link(added, file_path, removed=()):
+    """Apply a change to the link store: drop the links in `removed`, then add the ones in `added`.
+
+    Only the caller's own change is written on top of what is on disk, so
+    links other instances added or removed since we loaded it are kept.
+    """
+    with file_lock(file_path):
+        links = load_links(file_path)
+        links.difference_update(removed)
+        links |= set(added)
+        atomic_dump(links, file_path, pickle.dump)
 
 def load_links(file_path):
     try:
@@ -62,16 +76,32 @@ def load_links(file_path):
     except FileNotFoundError:
         return set()
     
-def save_ignored(ignored_files):
-    with open(ignored_file, 'wb') as f:
-        pickle.dump(ignored_files, f)
+def save_ignored(ignored_files, file_path):
+    with file_lock(file_path):
+        ignored_files |= load_ignored(file_path)
+        atomic_dump(ignored_files, file_path, pickle.dump)
 
-def load_ignored():
-    if os.path.exists(ignored_file):
-        with open(ignored_file, 'rb') as f:
+def load_ignored(file_path):
+    if os.path.exists(file_path):
+        with open(file_path, 'rb') as f:
             return pickle.load(f)
     return set()
 
+def save_skipped(skipped, rechecked, file_path):
+    """Merge this pass's skipped releases into the store, dropping the ones it rechecked."""
+    with file_lock(file_path):
+        stored = load_skipped(file_path)
+        for src in rechecked:
+            stored.pop(src, None)
+        stored.update(skipped)
+        atomic_dump(stored, file_path, pickle.dump)
+
+def load_skipped(file_path):
+    if os.path.exists(file_path):
+        with open(file_path, 'rb') as f:
+            return pickle.load(f)
+    return {}
+
 def save_settings(api_key, src_dir, dest_dir):
     settings = {
         'api_key': api_key,
@@ -81,16 +111,6 @@ def save_settings(api_key, src_dir, dest_dir):
     with open(SETTINGS_FILE, 'w') as file:
         json.dump(settings, file, indent=4)
 
-def get_api_key():
-    if os.path.exists(SETTINGS_FILE):
-        with open(SETTINGS_FILE, 'r') as file:
-            settings = json.load(file)
-            if settings['api_key']:
-                return settings.get('api_key')
-            else:
-                return None
-    return None
-
 def prompt_for_api_key():
     api_key = input("Please enter your TMDb API key: ")
     
@@ -104,6 +124,7 @@ def prompt_for_api_key():
     
     with open(SETTINGS_FILE, 'w') as file:
         json.dump(settings, file, indent=4)
+    return api_key
 
 def prompt_for_settings(api_key):
     src_dir = input("Enter the source directory path: ")
@@ -117,9 +138,94 @@ def get_settings():
             return json.load(file)
     return {}
 
+@dataclass
+class Config:
+    """Everything a run needs from settings.json and the command line, loaded once in main."""
+    src_dir: str = None
+    dest_dir: str = None
+    api_key: str = None
+    quality_preference: list = field(default_factory=lambda: list(DEFAULT_QUALITY_PREFERENCE))
+    keep_duplicates: bool = False
+    state_dir: str = ''
+
+    @classmethod
+    def load(cls, state_dir=None):
+        settings = get_settings()
+        return cls(
+            src_dir=settings.get('src_dir'),
+            dest_dir=settings.get('dest_dir'),
+            api_key=settings.get('api_key') or None,
+            quality_preference=settings.get('quality_preference') or list(DEFAULT_QUALITY_PREFERENCE),
+            keep_duplicates=settings.get('keep_duplicates', False),
+            state_dir=state_dir or '',
+        )
+
+    @property
+    def links_pkl(self):
+        return os.path.join(self.state_dir, 'symlinks.pkl')
+
+    @property
+    def ignored_file(self):
+        return os.path.join(self.state_dir, 'ignored.pkl')
+
+    @property
+    def skipped_file(self):
+        return os.path.join(self.state_dir, 'skipped.pkl')
+
+    @property
+    def lease_file(self):
+        return os.path.join(self.state_dir, 'organiser.lease')
+
+    @property
+    def series_meta_file(self):
+        return os.path.join(self.state_dir, 'series_meta.pkl')
+
+
+def normalise_title(title):
+    return re.sub(r'\s+', ' ', re.sub(r'[^\w\s]', '', title.lower())).strip()
+
+def seed_warm_cache(dest_dir):
+    """Learn already resolved shows and movies from the `{imdb-..}` folder names in dest_dir.
+
+    Entries are keyed by normalised title and year, and by title alone when
+    only one folder has that title, so lookups after a restart or cache
+    loss don't need Cinemeta or a prompt. The title-only entries are only
+    used with force, see warm_lookup.
+    """
+    by_title = {}
+    for media_dir in ('shows', 'anime_shows', 'movies'):
+        try:
+            entries = list(os.scandir(os.path.join(dest_dir, media_dir)))
+        except FileNotFoundError:
+            continue
+        for entry in entries:
+            match = re.match(r'^(.*) \((\d{4})[^)]*\) \{imdb-(tt\d+)\}$', entry.name)
+            if not match or not entry.is_dir():
+                continue
+            title, year, imdb_id = match.groups()
+            kind = 'movie' if media_dir == 'movies' else 'series'
+            value = entry.name if kind == 'movie' else (entry.name, imdb_id, media_dir)
+            key = (kind, normalise_title(title))
+            _warm_cache[key + (year,)] = value
+            by_title.setdefault(key, set()).add(value)
+    for key, values in by_title.items():
+        if len(values) == 1:
+            _warm_cache[key + (None,)] = values.pop()
+    return len(_warm_cache)
+
+def warm_lookup(kind, title, year=None, force=False):
+    """Without a year, only answer in force mode, where the first search result would be taken anyway.
+
+    Otherwise a new show would be bound to an older one with the same name
+    instead of getting the choice get_series_info offers.
+    """
+    if not year and not force:
+        return None
+    return _warm_cache.get((kind, normalise_title(title), str(year) if year else None))
 
 def get_moviedb_id(imdbid):
-    url = f"https://v3-cinemeta.strem.io/meta/series/{imdbid}.json"
+    import requests
+    url = f"{CINEMETA_URL}/meta/series/{imdbid}.json"
     try:
         response = requests.get(url)
         try:
@@ -141,8 +247,8 @@ def get_moviedb_id(imdbid):
     except requests.exceptions.RequestException as e:
         log_message('ERROR', f"Error: {e}")
 
-def is_anime(moviedb_id):
-    api_key = get_api_key()
+def is_anime(moviedb_id, api_key=None):
+    import requests
     if moviedb_id is None:
         return False
 
@@ -160,109 +266,122 @@ def is_anime(moviedb_id):
         print(f"Error fetching data: {e}")
         return False
     
-async def get_movie_info(title, year=None, force=False):
+async def get_movie_info(title, year=None, force=False, session=None):
+    import aiohttp, aioconsole
     global _api_cache
     formatted_title = title.replace(" ", "%20")
     cache_key = f"movie_{formatted_title}_{year}"
     
     if cache_key in _api_cache:
         return _api_cache[cache_key]
+
+    proper_name = warm_lookup('movie', title, year, force)
+    if proper_name:
+        _api_cache[cache_key] = proper_name
+        return proper_name
     
-    url = f"https://v3-cinemeta.strem.io/catalog/movie/top/search={formatted_title}.json"
-    async with aiohttp.ClientSession() as session:
-        try:
-            async with session.get(url) as response:
-                async with print_lock:
-                    if response.status == 404:
-                        imdb_id = await aioconsole.ainput(f"{Fore.YELLOW}Movie '{title}' not found. {Fore.WHITE}Please enter the IMDb ID: ")
-                        if imdb_id:
-                            url = f"https://v3-cinemeta.strem.io/catalog/movie/top/search={imdb_id}.json"
-                            async with session.get(url) as response:
-                                pass
-                        else:
-                            log_message('[WARN]', "IMDB id not provided, returning default title and dir")
-                            return title
+    if session is None:
+        async with aiohttp.ClientSession() as session:
+            return await get_movie_info(title, year, force, session)
 
-                    if response.status != 200:
-                        log_message('ERROR', f"Error fetching movie information: HTTP {response.status}")
-                        return title
-                try:
-                    movie_data = await response.json()
-                except aiohttp.ContentTypeError:
-                    log_message('ERROR', "Error decoding JSON response")
-                    return None
-
-                if 'metas' in movie_data and movie_data['metas']:
-                    movie_options = movie_data['metas']
-                    matched = False
-                    for movie_info in movie_options:
-                        imdb_id = movie_info.get('imdb_id')
-                        movie_title = movie_info.get('name')
-                        year_info = movie_info.get('releaseInfo')
-                        
-                        if are_similar(title.lower().strip(), movie_title.lower(), 0.90):
-                            proper_name = f"{movie_title} ({year_info}) {{imdb-{imdb_id}}}"
-                            _api_cache[cache_key] = proper_name
-                            return proper_name
+    url = f"{CINEMETA_URL}/catalog/movie/top/search={formatted_title}.json"
+    try:
+        async with session.get(url) as response:
+            async with print_lock:
+                if response.status == 404:
                     if force:
-                        
-                        chosen_movie = movie_options[0]
-                        imdb_id = chosen_movie.get('imdb_id')
-                        movie_title = chosen_movie.get('name')
-                        year_info = chosen_movie.get('releaseInfo')
+                        log_message('[WARN]', f"Movie '{title}' not found, returning default title and dir")
+                        return title
+                    imdb_id = await aioconsole.ainput(f"{Fore.YELLOW}Movie '{title}' not found. {Fore.WHITE}Please enter the IMDb ID: ")
+                    if imdb_id:
+                        url = f"{CINEMETA_URL}/catalog/movie/top/search={imdb_id}.json"
+                        async with session.get(url) as response:
+                            pass
+                    else:
+                        log_message('[WARN]', "IMDB id not provided, returning default title and dir")
+                        return title
+
+                if response.status != 200:
+                    log_message('ERROR', f"Error fetching movie information: HTTP {response.status}")
+                    return title
+            try:
+                movie_data = await response.json()
+            except aiohttp.ContentTypeError:
+                log_message('ERROR', "Error decoding JSON response")
+                return None
+
+            if 'metas' in movie_data and movie_data['metas']:
+                movie_options = movie_data['metas']
+                matched = False
+                for movie_info in movie_options:
+                    imdb_id = movie_info.get('imdb_id')
+                    movie_title = movie_info.get('name')
+                    year_info = movie_info.get('releaseInfo')
+                    
+                    if are_similar(title.lower().strip(), movie_title.lower(), 0.90):
                         proper_name = f"{movie_title} ({year_info}) {{imdb-{imdb_id}}}"
+                        _api_cache[cache_key] = proper_name
                         return proper_name
-                    if not matched:
-                        async with print_lock:
-                            log_message('[WARN]', f"No exact match found for {title}. Please choose from the following options or enter IMDb ID directly:")
-                            for i, movie_info in enumerate(movie_options[:3]):
-                                imdb_id = movie_info.get('imdb_id')
-                                movie_title = movie_info.get('name')
-                                year_info = movie_info.get('releaseInfo')
-                                log_message('[INFO]', f"{i+1}. {movie_title} ({year_info})")
-                            choice = await aioconsole.ainput("Enter the number of your choice, or enter IMDb ID directly: ")
-                            if choice.lower().startswith('tt'):
-                                imdb_id = choice
-                                url = f"https://cinemeta-live.strem.io/meta/movie/{imdb_id}.json"
-                                async with session.get(url) as response:
-                                    if response.status == 200:
-                                        movie_data = await response.json()
-                                        if 'meta' in movie_data and movie_data['meta']:
-                                            movie_info = movie_data['meta']
-                                            imdb_id = movie_info.get('imdb_id')
-                                            movie_title = movie_info.get('name')
-                                            year_info = movie_info.get('releaseInfo')
-                                            proper_name = f"{movie_title} ({year_info}) {{imdb-{imdb_id}}}"
-                                            _api_cache[cache_key] = proper_name
-                                            return proper_name
-                                        else:
-                                            log_message('ERROR', "No movie found with the provided IMDb ID")
-                                            return title
-                                    else:
-                                        log_message('ERROR', "Error fetching movie information with IMDb ID")
-                                        return title
-                            else:
-                                try:
-                                    choice = int(choice) - 1
-                                    if 0 <= choice < len(movie_options[:3]):
-                                        chosen_movie = movie_options[choice]
-                                        imdb_id = chosen_movie.get('imdb_id')
-                                        movie_title = chosen_movie.get('name')
-                                        year_info = chosen_movie.get('releaseInfo')
+                if force:
+                    
+                    chosen_movie = movie_options[0]
+                    imdb_id = chosen_movie.get('imdb_id')
+                    movie_title = chosen_movie.get('name')
+                    year_info = chosen_movie.get('releaseInfo')
+                    proper_name = f"{movie_title} ({year_info}) {{imdb-{imdb_id}}}"
+                    return proper_name
+                if not matched:
+                    async with print_lock:
+                        log_message('[WARN]', f"No exact match found for {title}. Please choose from the following options or enter IMDb ID directly:")
+                        for i, movie_info in enumerate(movie_options[:3]):
+                            imdb_id = movie_info.get('imdb_id')
+                            movie_title = movie_info.get('name')
+                            year_info = movie_info.get('releaseInfo')
+                            log_message('[INFO]', f"{i+1}. {movie_title} ({year_info})")
+                        choice = await aioconsole.ainput("Enter the number of your choice, or enter IMDb ID directly: ")
+                        if choice.lower().startswith('tt'):
+                            imdb_id = choice
+                            url = f"https://cinemeta-live.strem.io/meta/movie/{imdb_id}.json"
+                            async with session.get(url) as response:
+                                if response.status == 200:
+                                    movie_data = await response.json()
+                                    if 'meta' in movie_data and movie_data['meta']:
+                                        movie_info = movie_data['meta']
+                                        imdb_id = movie_info.get('imdb_id')
+                                        movie_title = movie_info.get('name')
+                                        year_info = movie_info.get('releaseInfo')
                                         proper_name = f"{movie_title} ({year_info}) {{imdb-{imdb_id}}}"
+                                        _api_cache[cache_key] = proper_name
                                         return proper_name
                                     else:
-                                        log_message('[WARN]', f"Invalid choice, returning '{title}'")
+                                        log_message('ERROR', "No movie found with the provided IMDb ID")
                                         return title
-                                except ValueError:
-                                    log_message('[WARN]', f"Invalid input, returning '{title}'")
+                                else:
+                                    log_message('ERROR', "Error fetching movie information with IMDb ID")
+                                    return title
+                        else:
+                            try:
+                                choice = int(choice) - 1
+                                if 0 <= choice < len(movie_options[:3]):
+                                    chosen_movie = movie_options[choice]
+                                    imdb_id = chosen_movie.get('imdb_id')
+                                    movie_title = chosen_movie.get('name')
+                                    year_info = chosen_movie.get('releaseInfo')
+                                    proper_name = f"{movie_title} ({year_info}) {{imdb-{imdb_id}}}"
+                                    return proper_name
+                                else:
+                                    log_message('[WARN]', f"Invalid choice, returning '{title}'")
                                     return title
-        except aiohttp.ClientError as e:
-            log_message('ERROR', f"Error fetching movie information: {e}")
-            return f'{title} {year}'
+                            except ValueError:
+                                log_message('[WARN]', f"Invalid input, returning '{title}'")
+                                return title
+    except aiohttp.ClientError as e:
+        log_message('ERROR', f"Error fetching movie information: {e}")
+        return f'{title} {year}'
 
 
-async def get_series_info(series_name, year=None, split=False, force=False):
+async def get_series_info(series_name, year=None, split=False, force=False, api_key=None):
+    import requests, aioconsole
     global _api_cache
     log_message("[INFO]", f"Current file: {series_name} year: {year}")
     shows_dir = "shows"
@@ -271,8 +390,14 @@ async def get_series_info(series_name, year=None, split=False, force=False):
     cache_key = f"series_{formatted_name}_{year}"
     if cache_key in _api_cache:
         return _api_cache[cache_key]
+
+    warm = warm_lookup('series', series_name, year, force)
+    if warm:
+        series_info, series_id, media_dir = warm
+        _api_cache[cache_key] = (series_info, series_id, media_dir if split else shows_dir)
+        return _api_cache[cache_key]
     
-    search_url = f"https://v3-cinemeta.strem.io/catalog/series/top/search={formatted_name}.json"
+    search_url = f"{CINEMETA_URL}/catalog/series/top/search={formatted_name}.json"
     response = requests.get(search_url, timeout=10)
     if response.status_code != 200:
         raise Exception(f"Error searching for series: {response.status_code}")
@@ -298,7 +423,7 @@ async def get_series_info(series_name, year=None, split=False, force=False):
         year = re.match(r'\b\d{4}\b', year).group()
         series_info = f"{selected_meta['name']} ({year}) {{imdb-{series_id}}}"
         if split:
-            shows_dir = "anime_shows" if is_anime(get_moviedb_id(series_id)) else "shows"
+            shows_dir = "anime_shows" if is_anime(get_moviedb_id(series_id), api_key) else "shows"
         _api_cache[cache_key] = (series_info, series_id, shows_dir)
         return series_info, series_id, shows_dir
     
@@ -320,7 +445,7 @@ async def get_series_info(series_name, year=None, split=False, force=False):
                 
             selected_index = await aioconsole.ainput(Fore.GREEN + "Enter the number of your choice, or enter IMDb ID directly:  " + Style.RESET_ALL)
             if selected_index.lower().startswith('tt'):
-                url = f"https://v3-cinemeta.strem.io/meta/series/{selected_index}.json"
+                url = f"{CINEMETA_URL}/meta/series/{selected_index}.json"
                 response = requests.get(url)
                 if response.status_code == 200:
                     show_data = response.json()
@@ -333,7 +458,7 @@ async def get_series_info(series_name, year=None, split=False, force=False):
                             series_info = f"{show_title} ({year_info}) {{imdb-{imdb_id}}}"
                             if split:
                                 log_message('[DEBUG]', f"dir before: {shows_dir}")
-                                shows_dir = "anime_shows" if is_anime(get_moviedb_id(imdb_id)) else "shows"
+                                shows_dir = "anime_shows" if is_anime(get_moviedb_id(imdb_id), api_key) else "shows"
                             _api_cache[cache_key] = (series_info, imdb_id, shows_dir)
                             return series_info, imdb_id, shows_dir
                     else:
@@ -370,7 +495,7 @@ async def get_series_info(series_name, year=None, split=False, force=False):
     year = re.match(r'\b\d{4}\b', year).group()
     series_info = f"{selected_meta['name']} ({year}) {{imdb-{series_id}}}"
     if split:
-        shows_dir = "anime_shows" if is_anime(get_moviedb_id(series_id)) else "shows"
+        shows_dir = "anime_shows" if is_anime(get_moviedb_id(series_id), api_key) else "shows"
     _api_cache[cache_key] = (series_info, series_id, shows_dir)
     return series_info, series_id, shows_dir
 
@@ -385,12 +510,17 @@ def format_multi_match(match):
 
 def get_episode_details(series_id, episode_identifier, name, year):
     
-    details_url = f"https://v3-cinemeta.strem.io/meta/series/{series_id}.json"
-    #print(details_url)
-    response = requests.get(details_url)
-    if response.status_code != 200:
-        raise Exception(f"Error getting series details: {response.status_code}")
-    series_details = response.json()
+    if series_id in _meta_cache:
+        series_details = _meta_cache[series_id]
+    else:
+        import requests
+        details_url = f"{CINEMETA_URL}/meta/series/{series_id}.json"
+        #print(details_url)
+        response = requests.get(details_url)
+        if response.status_code != 200:
+            raise Exception(f"Error getting series details: {response.status_code}")
+        series_details = response.json()
+        _meta_cache[series_id] = series_details
     if not series_details:
         if year:
             return f"{name} ({year}) - {episode_identifier.lower()}"
@@ -410,20 +540,120 @@ def get_episode_details(series_id, episode_identifier, name, year):
     season = int(re.search(r'S(\d{2}) ?E\d{2}', episode_identifier, re.IGNORECASE).group(1))
     episode = int(re.search(r'S(\d{2}) ?E(\d{2,3})', episode_identifier, re.IGNORECASE).group(2))
     
-    videos = meta.get('videos', [])
-    for video in videos:
-        if video['season'] == season and (video.get('episode') == episode or video.get('number') == episode):
-            show_name = meta.get('name')
-            if show_name is None:
-                show_name = name
-            if video.get('title') is None:
-                title = video.get('name')
-            else:
-                title = video.get('title')
+    video = find_episode(meta, season, episode)
+    if video:
+        show_name = meta.get('name')
+        if show_name is None:
+            show_name = name
+        title = episode_title(video)
+        if title:
             return f"{show_name} ({year}) - s{season:02d}e{episode:02d} - {title}"
+        return f"{show_name} ({year}) - s{season:02d}e{episode:02d}"
         
     return f"{meta.get('name')} ({year}) - {episode_identifier.lower()}"
 
+def find_episode(meta, season, episode):
+    for video in meta.get('videos', []):
+        if video['season'] == season and (video.get('episode') == episode or video.get('number') == episode):
+            return video
+    return None
+
+def episode_title(video):
+    if video.get('title') is None:
+        return video.get('name')
+    return video.get('title')
+
+def load_series_meta(file_path):
+    try:
+        with open(file_path, 'rb') as f:
+            return pickle.load(f)
+    except FileNotFoundError:
+        return {}
+
+def fetch_series_meta(session, series_id, cached=None):
+    """Fetch series metadata, revalidating `cached` with its ETag / Last-Modified.
+
+    Returns the new cache entry, or None when the server answered 304 Not Modified.
+    """
+    headers = {}
+    if cached:
+        if cached.get('etag'):
+            headers['If-None-Match'] = cached['etag']
+        if cached.get('last_modified'):
+            headers['If-Modified-Since'] = cached['last_modified']
+    response = session.get(f"{CINEMETA_URL}/meta/series/{series_id}.json", headers=headers, timeout=10)
+    if response.status_code == 304:
+        return None
+    if response.status_code != 200:
+        raise Exception(f"Error getting series details: {response.status_code}")
+    return {
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified'),
+        'details': response.json(),
+    }
+
+def retitle_episode(dest, meta):
+    """Return `dest` renamed to the episode title in `meta`, or None if the title is unknown or unchanged."""
+    match = re.match(r'^(.*? - s(\d{2,3})e(\d{2,3}))(?: - (.*?))?((?: \d{3,4}p| \(\d{3,4}p\)| \d{3,4}x\d{3,4})?(?: \(\d+\))?\.\w+)$', os.path.basename(dest))
+    if not match:
+        return None
+    prefix, season, episode, old_title, suffix = match.groups()
+    video = find_episode(meta, int(season), int(episode))
+    title = episode_title(video) if video else None
+    if not title or title == old_title:
+        return None
+    new_name = f"{prefix} - {title}{suffix}".replace('/', '')
+    return os.path.join(os.path.dirname(dest), new_name)
+
+def refresh_titles(config):
+    """Re-check every linked series once and rename episode links whose titles changed.
+
+    Each series is revalidated with a conditional request, so a series
+    whose metadata hasn't changed costs a single 304.
+    """
+    import requests
+    from registry import parse_dest
+
+    series_links = {}
+    for src, dest in load_links(config.links_pkl):
+        info = parse_dest(dest)
+        if info['imdb_id'] and info['episode'] is not None:
+            series_links.setdefault(info['imdb_id'], []).append((src, dest))
+
+    series_meta = load_series_meta(config.series_meta_file)
+    added, removed, unchanged = set(), set(), 0
+    with requests.Session() as session:
+        for series_id, links in series_links.items():
+            try:
+                entry = fetch_series_meta(session, series_id, series_meta.get(series_id))
+            except Exception as e:
+                log_message('ERROR', f"Could not refresh {series_id}: {e}")
+                continue
+            if entry is None:
+                unchanged += 1
+                continue
+            series_meta[series_id] = entry
+            meta = entry['details'].get('meta') or {}
+            for src, dest in links:
+                new_dest = retitle_episode(dest, meta)
+                if not new_dest or not os.path.islink(dest) or os.path.lexists(new_dest):
+                    continue
+                try:
+                    os.rename(dest, new_dest)
+                except OSError as e:
+                    log_message('ERROR', f"Could not rename {dest}: {e}")
+                    continue
+                removed.add((src, dest))
+                added.add((src, new_dest))
+                log_message('[SUCCESS]', f"Renamed: {Fore.LIGHTCYAN_EX}{os.path.basename(dest)} {Style.RESET_ALL}-> {os.path.basename(new_dest)}")
+
+    if added:
+        save_link(added, config.links_pkl, removed)
+    with file_lock(config.series_meta_file):
+        atomic_dump(series_meta, config.series_meta_file, pickle.dump)
+    log_message('[INFO]', f"Checked {len(series_links)} series, {unchanged} unchanged, {len(added)} episodes renamed")
+    return [dest for _, dest in added]
+
 def extract_year(query):
     match = re.search(r'\((\d{4})\)$', query.strip())
     if match:
@@ -454,6 +684,114 @@ def extract_resolution(filename):
             return match.group(1)
     return None
 
+def parse_show_folder(parent_folder_name):
+    """Parse a torrent folder once so every episode in a season pack can reuse the result.
+
+    `similar` and `series` memoise the name comparison and show lookup per
+    distinct show name found in the folder's files, so files that don't
+    match the folder still get resolved on their own.
+    """
+    return {
+        'name': parent_folder_name,
+        'folder_name': re.sub(r'\s*(S\d{2}.*|Season \d+).*|(\d{3,4}p)', '', parent_folder_name).replace('-', ' ').replace('.', ' '),
+        'show_name': re.sub(r'\s*(S\d{2}.*|Season \d+).*', '', parent_folder_name).replace('-', ' ').replace('.', ' ').strip(),
+        'year': extract_year_from_folder(parent_folder_name),
+        'resolution': extract_resolution(parent_folder_name),
+        'similar': {},
+        'series': {},
+    }
+
+def release_key(dest_file):
+    """Identify the movie or episode(s) a link is for, so different releases of it share a key."""
+    from registry import parse_dest
+    info = parse_dest(dest_file)
+    if not info['imdb_id']:
+        return None
+    if info['season'] is None:
+        return (info['imdb_id'],)
+    match = re.search(r'\bs(\d{2,3})e(\d{2,3})(?:-e(\d{2,3}))?', os.path.basename(dest_file), re.IGNORECASE)
+    if not match:
+        return None
+    first, last = int(match.group(2)), int(match.group(3) or match.group(2))
+    return (info['imdb_id'], int(match.group(1)), first, last)
+
+def release_rank(src_file, quality_preference):
+    """Position of the release's resolution in quality_preference; lower is better, unknown sorts last."""
+    resolution = extract_resolution(os.path.basename(src_file)) or extract_resolution(os.path.basename(os.path.dirname(src_file)))
+    if resolution and 'x' in resolution.lower():
+        resolution = resolution.lower().split('x')[1] + 'p'
+    preference = [quality.lower() for quality in quality_preference]
+    if resolution and resolution.lower() in preference:
+        return preference.index(resolution.lower())
+    return len(preference)
+
+def build_release_index(links, config):
+    """Best linked release per release_key, or None when config.keep_duplicates turns replacement off."""
+    if config.keep_duplicates:
+        return None
+    releases = {}
+    for src, dest in links:
+        key = release_key(dest)
+        if key and (key not in releases or release_rank(src, config.quality_preference) < release_rank(releases[key][0], config.quality_preference)):
+            releases[key] = (src, dest)
+    return releases
+
+def recheck_skipped(skipped, releases):
+    """Take the skipped releases whose key no longer has a linked release with its source in place out of skipped.
+
+    Returns their sources, which get resolved again like new files.
+    """
+    present = {}
+    rechecked = set()
+    for src, key in list(skipped.items()):
+        if releases is not None and key in releases:
+            if key not in present:
+                present[key] = os.path.exists(releases[key][0])
+            if present[key]:
+                continue
+        rechecked.add(src)
+        del skipped[src]
+    return rechecked
+
+def find_replaced_release(releases, src_file, dest_file, quality_preference):
+    """Return (key, link it replaces) for src_file, with the link set to 'skip' if the linked release is as good or better.
+
+    A linked release whose source has disappeared is always replaced.
+    """
+    if releases is None or os.path.isdir(src_file):
+        return None, None
+    key = release_key(dest_file)
+    current = releases.get(key)
+    if current is None or (os.path.exists(dest_file) and not os.path.islink(dest_file)):
+        return key, None
+    if os.path.exists(current[0]) and release_rank(src_file, quality_preference) >= release_rank(current[0], quality_preference):
+        return key, 'skip'
+    return key, current
+
+def replace_release(src_file, dest_file, replaced, existing_symlinks, links_file):
+    """Point dest_file at the better release in a single rename, then drop the link it replaces.
+
+    If dest_file is a link to yet another release (a duplicate linked before
+    releases were ranked), that link is overwritten too, so its registry
+    entry is dropped as well.
+    """
+    removed = {replaced}
+    if os.path.islink(dest_file):
+        current = os.readlink(dest_file)
+        if current not in (replaced[0], src_file):
+            removed.add((current, dest_file))
+    tmp_file = os.path.join(os.path.dirname(dest_file), f".{os.getpid()}.swap")
+    if os.path.lexists(tmp_file):
+        os.remove(tmp_file)
+    os.symlink(src_file, tmp_file)
+    os.replace(tmp_file, dest_file)
+    if replaced[1] != dest_file and os.path.islink(replaced[1]):
+        os.remove(replaced[1])
+    existing_symlinks.difference_update(removed)
+    existing_symlinks.add((src_file, dest_file))
+    save_link({(src_file, dest_file)}, links_file, removed)
+    return removed
+
 def get_unique_filename(dest_path, new_name):
     base_name, ext = os.path.splitext(new_name)
     counter = 1
@@ -463,7 +801,7 @@ def get_unique_filename(dest_path, new_name):
         counter += 1
     return unique_name
 
-async def process_movie(file, foldername, force=False):
+async def process_movie(file, foldername, force=False, session=None):
     path = f"/{foldername}"
     log_message("[INFO]", f"Current Movie file: {os.path.join(path,file)}")
     
@@ -485,10 +823,14 @@ async def process_movie(file, foldername, force=False):
         # Search the pattern in the string
         match = re.search(pattern, moviename)
         #log_message('[DEBUG]', f"Match: {match}")
-        title = match.group(1)
-        year = match.group(2).strip('()')
+        if match:
+            title = match.group(1)
+            year = match.group(2).strip('()')
+        else:
+            title = re.sub(r'\s*[\(\[]?\d{3,4}p.*$', '', moviename).strip() or moviename
+            year = None
         #resolution = match.group(3)
-    proper_name = await get_movie_info(title, year, force)
+    proper_name = await get_movie_info(title, year, force, session)
     if year is None or year == "":
         if proper_name is None:
             proper_name = title
@@ -498,8 +840,8 @@ async def process_movie(file, foldername, force=False):
     
     return proper_name, ext
 
-async def process_anime(file, pattern1, pattern2, split=False, force=False):
-    
+async def process_anime(file, pattern1, pattern2, split=False, force=False, api_key=None):
+    import aioconsole
     file = re.sub(r'^\[.*?\]\s*', '', file)
     name, ext = os.path.splitext(file)
     
@@ -538,7 +880,7 @@ async def process_anime(file, pattern1, pattern2, split=False, force=False):
             show_name = ' '.join(show_name.split(' ')[:-1])
         
         episode_identifier = f"s{int(season_number):02d}e{int(episode_number):03d}"
-        show_name, showid, showdir = await get_series_info(show_name.strip(), "", split, force)
+        show_name, showid, showdir = await get_series_info(show_name.strip(), "", split, force, api_key)
         year = re.search(r'\((\d{4})\)', show_name).group(1)
         name = get_episode_details(showid, episode_identifier, show_name, year)
         if resolution:
@@ -550,15 +892,30 @@ async def process_anime(file, pattern1, pattern2, split=False, force=False):
         
 
 
-async def process_movie_task(movie_name, movie_folder_name, src_file, dest_dir, existing_symlinks, links_pkl, ignored_files):
-    movie_name, ext = await process_movie(movie_name, movie_folder_name)
+async def process_movie_task(movie_name, movie_folder_name, src_file, config, existing_symlinks, ignored_files, symlink_created, releases, skipped, force=False, session=None):
+    movie_name, ext = await process_movie(movie_name, movie_folder_name, force, session)
     movie_name = movie_name.replace("/", " ")
     new_name = movie_name + ext
 
-    dest_path = os.path.join(dest_dir, "movies", movie_name)
+    dest_path = os.path.join(config.dest_dir, "movies", movie_name)
     os.makedirs(dest_path, exist_ok=True)
     dest_file = os.path.join(dest_path, new_name)
 
+    release, replaced = find_replaced_release(releases, src_file, dest_file, config.quality_preference)
+    if replaced == 'skip':
+        skipped[src_file] = release
+        log_message('[INFO]', f"Skipping {os.path.basename(src_file)}, {os.path.basename(releases[release][1])} is already linked in the same or better quality")
+        return
+    if replaced:
+        for old_src, _ in replace_release(src_file, dest_file, replaced, existing_symlinks, config.links_pkl):
+            if os.path.exists(old_src):
+                skipped[old_src] = release
+        releases[release] = (src_file, dest_file)
+        symlink_created.append(dest_file)
+        async with print_lock:
+            log_message("[SUCCESS]", f"Replaced with better release: {Fore.LIGHTCYAN_EX}{os.path.basename(dest_file)} {Style.RESET_ALL}-> {src_file}")
+        return
+
     if os.path.islink(dest_file):
         if os.readlink(dest_file) == src_file:
             return
@@ -570,38 +927,72 @@ async def process_movie_task(movie_name, movie_folder_name, src_file, dest_dir,
         return
 
     if os.path.isdir(src_file):
+        import shutil
         shutil.copytree(src_file, dest_file, symlinks=True)
     else:
         os.symlink(src_file, dest_file)
         existing_symlinks.add((src_file, dest_file))
-        save_link(existing_symlinks, links_pkl)
+        save_link({(src_file, dest_file)}, config.links_pkl)
+        symlink_created.append(dest_file)
+        if release:
+            releases[release] = (src_file, dest_file)
     
     clean_destination = os.path.basename(dest_file)
     async with print_lock:
         log_message("[SUCCESS]", f"Created symlink: {Fore.LIGHTCYAN_EX}{clean_destination} {Style.RESET_ALL}-> {src_file}")
 
-async def process_movies_in_batches(movies_cache, batch_size=5, ignored_files=None):
-    tasks = []
-    for movie_name, movie_details in movies_cache.items():
-        for movie_folder_name, src_file, dest_dir, existing_symlinks, links_pkl in movie_details:
-            tasks.append(process_movie_task(movie_name, movie_folder_name, src_file, dest_dir, existing_symlinks, links_pkl, ignored_files))
-            if len(tasks) == batch_size:
-                await asyncio.gather(*tasks)
-                tasks = []
-    if tasks:
-        await asyncio.gather(*tasks)
+async def process_movies(movie_jobs, config, existing_symlinks, ignored_files, symlink_created, releases, skipped, force=False, concurrency=MOVIE_CONCURRENCY):
+    """Resolve and link movies with at most `concurrency` lookups in flight over one shared session.
+
+    Unlike fixed batches, a slow lookup only holds up its own slot; the next
+    movie starts as soon as any other one finishes.
+    """
+    import aiohttp
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(movie_name, movie_folder_name, src_file):
+        async with semaphore:
+            try:
+                await process_movie_task(movie_name, movie_folder_name, src_file, config, existing_symlinks, ignored_files, symlink_created, releases, skipped, force, session)
+            except Exception as e:
+                log_message('ERROR', f"Error processing movie {src_file}: {e}")
 
-    movies_cache.clear()
+    async with aiohttp.ClientSession() as session:
+        await asyncio.gather(*(run(*job) for job in movie_jobs))
+    movie_jobs.clear()
 
-async def create_symlinks(src_dir, dest_dir, force=False, split=False):
+async def create_symlinks(config, force=False, split=False, folder=None, shard=None):
+    src_dir, dest_dir, api_key = config.src_dir, config.dest_dir, config.api_key
     os.makedirs(dest_dir, exist_ok=True)
-    log_message('[DEBUG]', 'processing...')
-    existing_symlinks = load_links(links_pkl)
-    ignored_files = load_ignored()
+    walk_dir = src_dir
+    if folder:
+        walk_dir = os.path.normpath(os.path.join(src_dir, folder))
+        if os.path.dirname(walk_dir) != os.path.normpath(src_dir) or not os.path.isdir(walk_dir):
+            log_message('[WARN]', f"Torrent folder not found in source directory: {folder}")
+            return []
+        if shard and shard_of(os.path.basename(walk_dir), shard[1]) != shard[0]:
+            log_message('[INFO]', f"Torrent folder belongs to another shard: {folder}")
+            return []
+    log_message('[DEBUG]', f'processing {walk_dir}...')
+    existing_symlinks = load_links(config.links_pkl)
+    ignored_files = load_ignored(config.ignored_file)
+    releases = build_release_index(existing_symlinks, config)
+    # Releases skipped for a better linked one are only looked at again once that one's source is gone
+    skipped = load_skipped(config.skipped_file)
+    rechecked = recheck_skipped(skipped, releases)
+    _meta_cache.clear()
     symlink_created = []
-    movies_cache = defaultdict(list)
+    movie_jobs = []
     
-    for root, dirs, files in os.walk(src_dir):
+    for root, dirs, files in os.walk(walk_dir):
+        # Sorted so that which of two equally good releases gets linked doesn't depend on the filesystem
+        dirs.sort()
+        files.sort()
+        if shard and not folder and root == walk_dir:
+            # Torrent folders (and loose files) are split between workers by name
+            dirs[:] = [d for d in dirs if shard_of(d, shard[1]) == shard[0]]
+            files = [f for f in files if shard_of(f, shard[1]) == shard[0]]
+        folder_info = None
         for file in files:
             src_file = os.path.join(root, file)
             is_anime = False
@@ -609,7 +1000,7 @@ async def create_symlinks(src_dir, dest_dir, force=False, split=False):
             media_dir = "shows"
             symlink_exists = False
             
-            if src_file in ignored_files:
+            if src_file in skipped or (src_file in ignored_files and src_file not in rechecked):
                continue
             
             symlink_exists |= any(
@@ -636,16 +1027,15 @@ async def create_symlinks(src_dir, dest_dir, force=False, split=False):
                 pattern = re.compile(r'(?!.* - \d+\.\d+GB)(.*) - (\d{2,3})(?:v2)?\b(?: (\[?\(?\d{3,4}p\)?\]?))?')
                 alt_pattern = re.compile(r'S(\d{1,2}) - (\d{2})')
                 if re.search(pattern, file) or re.search(alt_pattern, file):
-                    show_folder, season_number, new_name, media_dir = await process_anime(file, pattern, alt_pattern, split, force)
+                    show_folder, season_number, new_name, media_dir = await process_anime(file, pattern, alt_pattern, split, force, api_key)
                     season_folder = f"Season {int(season_number):02d}"
                     is_anime = True
                 else:
-                    continue # you can comment this line to enable the processing of movies
-                    is_movie = True
-                    movie_folder_name = os.path.basename(root)
-                    movies_cache[file].append((movie_folder_name, src_file, dest_dir, existing_symlinks, links_pkl))
-                    if len(movies_cache) >= 5:
-                        await process_movies_in_batches(movies_cache, ignored_files=ignored_files)
+                    if os.path.normpath(root) == os.path.normpath(src_dir):
+                        movie_folder_name = os.path.splitext(file)[0]
+                    else:
+                        movie_folder_name = os.path.basename(root)
+                    movie_jobs.append((file, movie_folder_name, src_file))
                     continue
 
             if not is_movie and not is_anime:
@@ -667,15 +1057,20 @@ async def create_symlinks(src_dir, dest_dir, force=False, split=False):
                 elif edge_case_episode_match:
                     episode_identifier = re.sub(r'S(\d{3}) ?E(\d{2})', lambda m: f's{int(m.group(1)):d}e{m.group(2)}', episode_identifier)
                     
-                parent_folder_name = os.path.basename(root)
-                folder_name = re.sub(r'\s*(S\d{2}.*|Season \d+).*|(\d{3,4}p)', '', parent_folder_name).replace('-', ' ').replace('.', ' ')
+                if folder_info is None:
+                    folder_info = parse_show_folder(os.path.basename(root))
+                parent_folder_name = folder_info['name']
+                folder_name = folder_info['folder_name']
                 
                 if re.match(r'S\d{2} ?E\d{2}', file, re.IGNORECASE):
-                    show_name = re.sub(r'\s*(S\d{2}.*|Season \d+).*', '', parent_folder_name).replace('-', ' ').replace('.', ' ').strip()
+                    show_name = folder_info['show_name']
                 else:
                     show_name = episode_match.group(1).replace('.', ' ').strip()
                 
-                if are_similar(folder_name.lower(), show_name.lower()):
+                similar = folder_info['similar'].get(show_name)
+                if similar is None:
+                    similar = folder_info['similar'][show_name] = are_similar(folder_name.lower(), show_name.lower())
+                if similar:
                     show_name = folder_name    
 
                 name, ext = os.path.splitext(file)
@@ -695,18 +1090,19 @@ async def create_symlinks(src_dir, dest_dir, force=False, split=False):
                 if show_folder.isdigit() and len(show_folder) <= 4:
                     year = None
                 else:
-                    year = extract_year_from_folder(parent_folder_name) or extract_year(show_folder)
+                    year = folder_info['year'] or extract_year(show_folder)
                     if year:
                         show_folder = re.sub(r'\(\d{4}\)$', '', show_folder).strip()
                         show_folder = re.sub(r'\d{4}$', '', show_folder).strip()       
-                show_folder, showid, media_dir = await get_series_info(show_folder, year, split, force)
+                series_key = (show_folder, year)
+                if series_key not in folder_info['series']:
+                    folder_info['series'][series_key] = await get_series_info(show_folder, year, split, force, api_key)
+                show_folder, showid, media_dir = folder_info['series'][series_key]
                 show_folder = show_folder.replace('/', '')
                 
                 resolution = extract_resolution(new_name)
                 if not resolution:
-                    resolution = extract_resolution(parent_folder_name)
-                    if resolution is not None:
-                        resolution = f"{resolution}"
+                    resolution = folder_info['resolution']
                         
                 file_name = re.search(r'(^.*S\d{2}E\d{2})', new_name)
                 if file_name:
@@ -725,6 +1121,21 @@ async def create_symlinks(src_dir, dest_dir, force=False, split=False):
                     
             os.makedirs(dest_path, exist_ok=True)
             dest_file = os.path.join(dest_path, new_name)
+
+            release, replaced = find_replaced_release(releases, src_file, dest_file, config.quality_preference)
+            if replaced == 'skip':
+                skipped[src_file] = release
+                log_message('[INFO]', f"Skipping {file}, {os.path.basename(releases[release][1])} is already linked in the same or better quality")
+                continue
+            if replaced:
+                for old_src, _ in replace_release(src_file, dest_file, replaced, existing_symlinks, config.links_pkl):
+                    if os.path.exists(old_src):
+                        skipped[old_src] = release
+                releases[release] = (src_file, dest_file)
+                symlink_created.append(dest_file)
+                log_message("[SUCCESS]", f"Replaced {os.path.basename(replaced[1])} with better release: {Fore.LIGHTCYAN_EX}{os.path.basename(dest_file)} {Style.RESET_ALL}-> {src_file}")
+                continue
+
             if os.path.islink(dest_file):
                 if os.readlink(dest_file) == src_file:
                     continue
@@ -737,6 +1148,7 @@ async def create_symlinks(src_dir, dest_dir, force=False, split=False):
                 continue
 
             if os.path.isdir(src_file):
+                import shutil
                 shutil.copytree(src_file, dest_file, symlinks=True)
             else:
                 try:
@@ -750,59 +1162,233 @@ async def create_symlinks(src_dir, dest_dir, force=False, split=False):
                     else:
                         raise
                 existing_symlinks.add((src_file, dest_file))
-                save_link(existing_symlinks, links_pkl)
+                save_link({(src_file, dest_file)}, config.links_pkl)
                 symlink_created.append(dest_file)
+                if release:
+                    releases[release] = (src_file, dest_file)
                 
             clean_destination = os.path.basename(dest_file)
             log_message("[SUCCESS]", f"Created symlink: {Fore.LIGHTCYAN_EX}{clean_destination} {Style.RESET_ALL}-> {src_file}")
 
-    if movies_cache:
-        await process_movies_in_batches(movies_cache, ignored_files=ignored_files)
+    if movie_jobs:
+        await process_movies(movie_jobs, config, existing_symlinks, ignored_files, symlink_created, releases, skipped, force)
 
-    save_ignored(ignored_files)
+    save_ignored(ignored_files, config.ignored_file)
+    save_skipped(skipped, rechecked, config.skipped_file)
     return symlink_created
 
-async def main():
-    settings = get_settings()
+def parse_remap(value):
+    old, sep, new = value.partition('=')
+    if not sep or not old:
+        raise argparse.ArgumentTypeError(f"Invalid remap '{value}', expected OLD_PREFIX=NEW_PREFIX")
+    return old.rstrip('/'), new.rstrip('/')
+
+def remap_path(path, remaps):
+    """Swap the longest matching OLD prefix (on a path boundary) for its NEW one."""
+    for old, new in sorted(remaps, key=lambda remap: len(remap[0]), reverse=True):
+        if path == old or path.startswith(old + '/'):
+            return new + path[len(old):]
+    return path
+
+def rebuild_dir(directory, links):
+    """Recreate one destination directory's links; returns (created, unchanged).
 
+    Errors are logged per link (or for the whole directory if it can't be
+    created) so one bad entry doesn't stop the rest of the rebuild.
+    """
+    created = unchanged = 0
+    try:
+        os.makedirs(directory, exist_ok=True)
+    except OSError as e:
+        log_message('ERROR', f"Could not create {directory}, skipping {len(links)} links: {e}")
+        return created, unchanged
+    for src, dest in links:
+        try:
+            current = os.readlink(dest)
+        except FileNotFoundError:
+            current = None
+        except OSError:
+            log_message('[WARN]', f"Not replacing existing file: {dest}")
+            continue
+        if current == src:
+            unchanged += 1
+            continue
+        try:
+            if current is None:
+                os.symlink(src, dest)
+            else:
+                tmp_file = os.path.join(directory, f".{os.getpid()}.swap")
+                if os.path.lexists(tmp_file):
+                    os.remove(tmp_file)
+                os.symlink(src, tmp_file)
+                os.replace(tmp_file, dest)
+        except OSError as e:
+            log_message('ERROR', f"Could not rebuild {dest}: {e}")
+            continue
+        created += 1
+    return created, unchanged
+
+def rebuild_links(config, remaps=(), workers=REBUILD_WORKERS):
+    """Recreate every link in the registry without any metadata lookups.
+
+    Links are grouped by destination directory and each group is handled
+    by a worker thread. Source paths are rewritten with `remaps` first, and
+    the registry is updated to match.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    by_dir, remapped = {}, {}
+    for src, dest in load_links(config.links_pkl):
+        new_src = remap_path(src, remaps)
+        if new_src != src:
+            remapped[(src, dest)] = (new_src, dest)
+        by_dir.setdefault(os.path.dirname(dest), []).append((new_src, dest))
+
+    if remapped:
+        # A mistyped prefix would otherwise rewrite every registry entry for good
+        missing = [new for _, new in remaps if not os.path.exists(new)]
+        if missing:
+            log_message('ERROR', f"Not rebuilding, remapped source folder not found: {', '.join(missing)}")
+            return 0
+        if not any(os.path.exists(src) for src, _ in remapped.values()):
+            log_message('ERROR', f"Not rebuilding, none of the {len(remapped)} remapped source files exist")
+            return 0
+
+    created = unchanged = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for dir_created, dir_unchanged in pool.map(lambda item: rebuild_dir(*item), by_dir.items()):
+            created += dir_created
+            unchanged += dir_unchanged
+
+    if remapped:
+        save_link(set(remapped.values()), config.links_pkl, set(remapped))
+    log_message('[SUCCESS]', f"Rebuilt {created} links in {len(by_dir)} folders, {unchanged} already in place, {len(remapped)} sources remapped")
+    return created
+
+def registry_lease(config, shard=None):
+    """Lease for writing the registry.
+
+    Unsharded writers (full passes, --rebuild, --refresh-titles) hold the
+    registry lease itself, which also waits for every shard lease to be
+    free. A shard worker holds only its own shard lease, so workers for
+    different shards run side by side, but none of them starts while the
+    registry lease is held.
+    """
+    base = os.path.splitext(config.lease_file)[0]
+    if shard:
+        path = f"{base}-shard{shard[0]}of{shard[1]}.lease"
+        return hold_lease(path, excludes=[glob.escape(config.lease_file)], lock=config.lease_file, log=log_message)
+    return hold_lease(config.lease_file, excludes=[f"{glob.escape(base)}-shard*.lease"], lock=config.lease_file, log=log_message)
+
+async def run_pass(config, force=False, split=False, folder=None, shard=None):
+    """Run create_symlinks while holding the registry lease.
+
+    Returns the links created, or None when the pass was skipped because
+    another instance holds the lease.
+    """
+    try:
+        with registry_lease(config, shard):
+            return await create_symlinks(config, force, split, folder, shard)
+    except LeaseHeld as e:
+        log_message('[WARN]', f"Skipping run, another instance is already processing: {e}")
+        return None
+
+async def update_plex(dest_dir, paths=None):
+    """Refresh the Plex sections under dest_dir, or only the folders of `paths` when given."""
+    from scan_plex import ensure_plex_config, scan_plex_library_sections, scan_plex_paths
+    log_message('[SUCCESS]', 'Attempting to update Plex Library sections')
+    try:
+        plex_url, plex_token = await ensure_plex_config()
+        if paths:
+            scan_plex_paths({os.path.dirname(path) for path in paths}, plex_url, plex_token)
+        else:
+            scan_plex_library_sections(dest_dir, plex_url, plex_token)
+    except Exception as e:
+        log_message('ERROR', f"Error updating Plex Library sections: {e}")
+
+async def main():
     parser = argparse.ArgumentParser(description="Create symlinks for files from src_dir in dest_dir.")
     parser.add_argument("--split-dirs", action="store_true", help="Use separate directories for anime")
     parser.add_argument("--loop", action="store_true", help="When this is used, the script will periodically scan the source directory and automatically choose the first result when querying movies and/or shows")
+    parser.add_argument("--daemon", action="store_true", help="Like --loop, but also listen on a local socket for scan triggers and adapt the scan interval to how busy the library is")
+    parser.add_argument("--trigger", nargs="?", const="", metavar="FOLDER", help="Ask a running daemon to scan now, optionally only the given torrent folder")
+    parser.add_argument("--status", action="store_true", help="Print the status of a running daemon")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET, help=f"Daemon socket path (default: {DEFAULT_SOCKET})")
+    parser.add_argument("--refresh-titles", action="store_true", help="Re-check the metadata of every linked series and rename episodes whose titles changed")
+    parser.add_argument("--rebuild", action="store_true", help="Recreate every link recorded in symlinks.pkl without looking anything up, e.g. after losing dest_dir")
+    parser.add_argument("--remap", type=parse_remap, action="append", default=[], metavar="OLD=NEW", help="With --rebuild, replace the source path prefix OLD with NEW (can be repeated)")
+    parser.add_argument("--state-dir", help="Directory holding symlinks.pkl, ignored.pkl, skipped.pkl and the instance lease, e.g. on a mount shared by several hosts (default: current directory)")
+    parser.add_argument("--shard", type=parse_shard, metavar="INDEX/COUNT", help="Only process torrent folders whose name hashes to this shard, e.g. 0/3 on the first of three workers")
     args = parser.parse_args()
+
+    config = Config.load(args.state_dir)
+    if args.state_dir:
+        os.makedirs(args.state_dir, exist_ok=True)
+
+    if args.trigger is not None or args.status:
+        try:
+            if args.trigger is not None:
+                reply = await send_command('scan', args.socket, folder=args.trigger)
+            else:
+                reply = await send_command('status', args.socket)
+        except OSError as e:
+            log_message('ERROR', f"Could not reach daemon on {args.socket}: {e}")
+            raise SystemExit(1)
+        print(json.dumps(reply, indent=4))
+        return
+
     force = False
-    apikey = get_api_key()
     
     if args.split_dirs:
-        if apikey is None or apikey == "" or apikey == "null":
-            apikey = prompt_for_api_key()
+        if config.api_key is None or config.api_key == "null":
+            config.api_key = prompt_for_api_key()
         
-    if 'src_dir' not in settings or 'dest_dir' not in settings:
+    if config.src_dir is None or config.dest_dir is None:
         log_message("[INFO]", f"Missing configuration in settings.json. Please provide necessary inputs.{Style.RESET_ALL}")
-        src_dir, dest_dir = prompt_for_settings(apikey)
-    else:
-        src_dir = settings['src_dir']
-        dest_dir = settings['dest_dir']
+        config.src_dir, config.dest_dir = prompt_for_settings(config.api_key)
         
-    if args.loop:
+    if args.rebuild:
+        try:
+            with registry_lease(config):
+                created = rebuild_links(config, args.remap)
+        except LeaseHeld as e:
+            log_message('[WARN]', f"Skipping rebuild, another instance is already processing: {e}")
+            return
+        if created:
+            await update_plex(config.dest_dir)
+        return
+
+    if args.refresh_titles:
+        try:
+            with registry_lease(config):
+                renamed = refresh_titles(config)
+        except LeaseHeld as e:
+            log_message('[WARN]', f"Skipping title refresh, another instance is already processing: {e}")
+            return
+        if renamed:
+            await update_plex(config.dest_dir, renamed)
+        return
+
+    log_message('[INFO]', f"Loaded {seed_warm_cache(config.dest_dir)} known titles from {config.dest_dir}")
+
+    if args.daemon:
+        async def daemon_pass(folder):
+            created = await run_pass(config, True, split=args.split_dirs, folder=folder, shard=args.shard)
+            if created:
+                await update_plex(config.dest_dir, created)
+            return created
+
+        await run_daemon(daemon_pass, args.socket, log=log_message)
+    elif args.loop:
         force = True
         while True:
-            if await create_symlinks(src_dir, dest_dir, force, split=args.split_dirs):
-                log_message('[SUCCESS]', 'Attempting to update Plex Library sections')
-                try:
-                    plex_url, plex_token = await ensure_plex_config()
-                    await scan_plex_library_sections(dest_dir, plex_url, plex_token)
-                except Exception as e:
-                    log_message('ERROR', f"Error updating Plex Library sections: {e}")
+            if await run_pass(config, force, split=args.split_dirs, shard=args.shard):
+                await update_plex(config.dest_dir)
             log_message('[INFO]', "Sleeping for 2 minutes before next run...")
-            time.sleep(120)
+            await asyncio.sleep(120)
     else:
-        if await create_symlinks(src_dir, dest_dir, force, split=args.split_dirs):
-            log_message('[SUCCESS]', 'Attempting to update Plex Library sections')
-            try:
-                plex_url, plex_token = await ensure_plex_config()
-                await scan_plex_library_sections(dest_dir, plex_url, plex_token)
-            except Exception as e:
-                log_message('ERROR', f"Error updating Plex Library sections: {e}")
+        if await run_pass(config, force, split=args.split_dirs, shard=args.shard):
+            await update_plex(config.dest_dir)
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,180 @@
+import os
+import re
+import json
+import time
+import pickle
+import sqlite3
+import argparse
+from datetime import datetime
+
+LINKS_FILE = 'symlinks.pkl'
+INDEX_FILE = 'symlinks.db'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS links (
+    src TEXT NOT NULL,
+    dest TEXT NOT NULL,
+    imdb_id TEXT,
+    media_dir TEXT,
+    show TEXT COLLATE NOCASE,
+    season INTEGER,
+    episode INTEGER,
+    created REAL,
+    UNIQUE (src, dest)
+);
+CREATE INDEX IF NOT EXISTS links_dest ON links (dest);
+CREATE INDEX IF NOT EXISTS links_src ON links (src);
+CREATE INDEX IF NOT EXISTS links_imdb ON links (imdb_id);
+CREATE INDEX IF NOT EXISTS links_show ON links (show, season, episode);
+CREATE INDEX IF NOT EXISTS links_created ON links (created);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+COLUMNS = ('src', 'dest', 'imdb_id', 'media_dir', 'show', 'season', 'episode', 'created')
+
+
+def parse_dest(dest):
+    """Recover what a link points at from its destination path.
+
+    Works for both `<media_dir>/<Show (Year) {imdb-tt..}>/Season NN/<episode>`
+    and `movies/<Movie (Year) {imdb-tt..}>/<file>`.
+    """
+    parts = os.path.normpath(dest).split(os.sep)
+    info = {'imdb_id': None, 'media_dir': None, 'show': None, 'season': None, 'episode': None}
+    for i, part in enumerate(parts[:-1]):
+        match = re.search(r'\{imdb-(tt\d+)\}', part)
+        if match:
+            info['imdb_id'] = match.group(1)
+            info['show'] = part[:match.start()].strip()
+            info['media_dir'] = parts[i - 1] if i > 0 else None
+            break
+    season_match = re.match(r'Season (\d+)$', parts[-2]) if len(parts) > 1 else None
+    if season_match:
+        info['season'] = int(season_match.group(1))
+        episode_match = re.search(r'\bs\d{2,3}e(\d{2,3})', parts[-1], re.IGNORECASE)
+        if episode_match:
+            info['episode'] = int(episode_match.group(1))
+    return info
+
+def _link_created(dest):
+    """The link's own mtime, or None when it doesn't exist (yet) so `since` leaves it out."""
+    try:
+        return os.lstat(dest).st_mtime
+    except OSError:
+        return None
+
+def connect(index_file=INDEX_FILE):
+    conn = sqlite3.connect(index_file)
+    conn.row_factory = sqlite3.Row
+    conn.executescript(SCHEMA)
+    return conn
+
+def _fill_created(conn):
+    """Date links that were indexed while their destination was missing, once it exists (e.g. after --rebuild)."""
+    rows = conn.execute("SELECT rowid, dest FROM links WHERE created IS NULL").fetchall()
+    updates = []
+    for row in rows:
+        created = _link_created(row['dest'])
+        if created is not None:
+            updates.append((created, row['rowid']))
+    if updates:
+        with conn:
+            conn.executemany("UPDATE links SET created = ? WHERE rowid = ?", updates)
+
+def sync_index(conn, links_file=LINKS_FILE):
+    """Bring the index in line with the pickled link set, only touching entries that changed."""
+    try:
+        stat = os.stat(links_file)
+    except FileNotFoundError:
+        return
+    stamp = f"{stat.st_mtime_ns}:{stat.st_size}"
+    row = conn.execute("SELECT value FROM meta WHERE key = 'stamp'").fetchone()
+    if row and row['value'] == stamp:
+        _fill_created(conn)
+        return
+
+    with open(links_file, 'rb') as f:
+        links = set(pickle.load(f))
+    indexed = set(conn.execute("SELECT src, dest FROM links").fetchall())
+    indexed = {tuple(link) for link in indexed}
+
+    with conn:
+        conn.executemany("DELETE FROM links WHERE src = ? AND dest = ?", indexed - links)
+        rows = []
+        for src, dest in links - indexed:
+            info = parse_dest(dest)
+            rows.append((src, dest, info['imdb_id'], info['media_dir'], info['show'],
+                         info['season'], info['episode'], _link_created(dest)))
+        conn.executemany(f"INSERT OR IGNORE INTO links ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})", rows)
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('stamp', ?)", (stamp,))
+    _fill_created(conn)
+
+def open_index(links_file=LINKS_FILE, index_file=INDEX_FILE):
+    conn = connect(index_file)
+    sync_index(conn, links_file)
+    return conn
+
+def _rows(cursor):
+    return [dict(row) for row in cursor.fetchall()]
+
+def find_by_dest(conn, dest):
+    return _rows(conn.execute("SELECT * FROM links WHERE dest IN (?, ?)", (dest, os.path.normpath(dest))))
+
+def find_by_src(conn, src):
+    return _rows(conn.execute("SELECT * FROM links WHERE src IN (?, ?)", (src, os.path.normpath(src))))
+
+def find_by_imdb(conn, imdb_id):
+    return _rows(conn.execute("SELECT * FROM links WHERE imdb_id = ? ORDER BY season, episode, dest", (imdb_id,)))
+
+def find_by_show(conn, show, season=None):
+    """Match the show folder title exactly, or followed by its year, so both 'Show Name' and 'Show Name (2019)' work."""
+    query = "SELECT * FROM links WHERE (show = ? OR show LIKE ? ESCAPE '\\')"
+    params = [show, show.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + ' (%']
+    if season is not None:
+        query += " AND season = ?"
+        params.append(season)
+    return _rows(conn.execute(query + " ORDER BY show, season, episode", params))
+
+def find_since(conn, since):
+    return _rows(conn.execute("SELECT * FROM links WHERE created >= ? ORDER BY created", (since,)))
+
+def parse_time(value):
+    """Accept epoch seconds, an ISO date/time, or a relative age like 30m, 12h, 7d."""
+    match = re.fullmatch(r'(\d+)([smhd])', value)
+    if match:
+        seconds = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}[match.group(2)]
+        return time.time() - int(match.group(1)) * seconds
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+def main():
+    parser = argparse.ArgumentParser(description='Query the link registry. Results are printed as JSON.')
+    parser.add_argument('--links', default=LINKS_FILE, help=f'Pickled link set (default: {LINKS_FILE})')
+    parser.add_argument('--index', default=INDEX_FILE, help=f'Index database, rebuilt from the link set when it changes (default: {INDEX_FILE})')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('source', help='Source file backing a destination (Plex) path').add_argument('dest')
+    subparsers.add_parser('dest', help='Destination links created for a source file').add_argument('src')
+    subparsers.add_parser('imdb', help='Everything linked for an IMDb id').add_argument('imdb_id')
+    show_parser = subparsers.add_parser('show', help='Everything linked for a show, optionally one season')
+    show_parser.add_argument('name')
+    show_parser.add_argument('--season', type=int)
+    subparsers.add_parser('since', help='Links created since a time (epoch, ISO date or 30m/12h/7d)').add_argument('time')
+    args = parser.parse_args()
+
+    conn = open_index(args.links, args.index)
+    if args.command == 'source':
+        results = find_by_dest(conn, args.dest)
+    elif args.command == 'dest':
+        results = find_by_src(conn, args.src)
+    elif args.command == 'imdb':
+        results = find_by_imdb(conn, args.imdb_id)
+    elif args.command == 'show':
+        results = find_by_show(conn, args.name, args.season)
+    else:
+        results = find_since(conn, parse_time(args.time))
+    conn.close()
+    print(json.dumps(results, indent=4))
+
+if __name__ == '__main__':
+    main()
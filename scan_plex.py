@@ -103,6 +103,35 @@ def scan_plex_library_sections(src_dir, plex_url, plex_token):
         except subprocess.CalledProcessError as e:
             print(f"Failed to scan library section: {subdir}. Error: {e}")
             
+def scan_plex_paths(paths, plex_url, plex_token):
+    """Ask Plex to rescan only the given folders instead of whole library sections."""
+    try:
+        sections = get_plex_library_sections(plex_url, plex_token)
+    except Exception as e:
+        print(f"Failed to retrieve library sections from Plex: {e}")
+        return
+
+    for path in sorted(paths):
+        section_id = None
+        for key, info in sections.items():
+            if any(path == location or path.startswith(location.rstrip('/') + '/') for location in info['locations']):
+                section_id = key
+
+        if not section_id:
+            print(f"No matching library section found in Plex for: {path}")
+            continue
+
+        try:
+            response = requests.get(f"{plex_url}/library/sections/{section_id}/refresh",
+                                    params={'path': path, 'X-Plex-Token': plex_token}, timeout=10)
+        except requests.exceptions.RequestException as e:
+            print(f"Failed to scan: {path}. Error: {e}")
+            continue
+        if response.status_code == 200:
+            print(f"Successfully requested scan of: {path}")
+        else:
+            print(f"Failed to scan: {path}. HTTP {response.status_code}")
+
 async def main():
     parser = argparse.ArgumentParser(description='Scan Plex library sections.')
     parser.add_argument('src_dir', type=str, help='Source directory to scan.')